@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import Response
 from pydantic import BaseModel
 from typing import Optional
+from contextlib import asynccontextmanager
 import base64, sys, os
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -13,11 +14,24 @@ class VerifyResponse(BaseModel):
     message: str
 from signature.digital_signature import DigitalSignature
 from signature.pdf_signature import PdfSigner
+from signature.signature_ledger import SignatureLedger
+
+# Sổ cái lưu các chữ ký đã tạo bởi /sign, mở khi start và đóng khi shutdown
+LEDGER_DIR = os.environ.get(
+    "SIGNATURE_LEDGER_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ledger")
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.ledger = SignatureLedger(LEDGER_DIR)
+    yield
+    app.state.ledger.close()
 
 app = FastAPI(
     title="Digital Signature API",
     description="RSA Digital Signature System - Custom RSA + SHA-256",
-    version="3.0.0"
+    version="3.0.0",
+    lifespan=lifespan
 )
 app.add_middleware(
     CORSMiddleware,
@@ -34,7 +48,10 @@ def str_to_key(s: str) -> tuple:
     parts = s.strip().split(':')
     if len(parts) != 2:
         raise ValueError("Key phải có format e:n hoặc d:n")
-    return (int(parts[0]), int(parts[1]))
+    key = (int(parts[0]), int(parts[1]))
+    if key[0] <= 0 or key[1] <= 0:
+        raise ValueError("Key phải gồm các số nguyên dương")
+    return key
 
 # Health check
 @app.get("/")
@@ -65,7 +82,7 @@ async def sign_file(file: UploadFile = File(...), private_key: UploadFile = File
     except (ValueError, UnicodeDecodeError):
         raise HTTPException(400, "Private key không hợp lệ")
     key_size = priv_key[1].bit_length()
-    ds = DigitalSignature(key_size=key_size)
+    ds = DigitalSignature(key_size=key_size, ledger=app.state.ledger)
     signature = ds.sign(file_data, private_key=priv_key)
     signature_b64 = base64.b64encode(str(signature).encode('utf-8'))
     return Response(
@@ -101,6 +118,34 @@ async def verify_file(
         message="✓ HỢP LỆ" if valid else "✗ KHÔNG HỢP LỆ"
     )
 
+# Tra cứu ledger: digest đã được ký bởi public key này chưa
+@app.post("/ledger/lookup")
+async def ledger_lookup(digest: str = Form(...), public_key_file: UploadFile = File(...)):
+    try:
+        digest_bytes = bytes.fromhex(digest.strip())
+    except ValueError:
+        raise HTTPException(400, "Digest phải là chuỗi hex")
+    if len(digest_bytes) != 32:
+        raise HTTPException(400, "Digest SHA-256 phải dài 32 bytes")
+    key_data = await public_key_file.read()
+    try:
+        pub_key = str_to_key(key_data.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(400, "Public key không đúng format")
+    try:
+        entry = app.state.ledger.lookup(pub_key, digest_bytes)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if entry is None:
+        return {"found": False, "digest": digest_bytes.hex()}
+    return {
+        "found": True,
+        "digest": digest_bytes.hex(),
+        "key_fingerprint": entry.fingerprint.hex(),
+        "signature": base64.b64encode(str(entry.signature).encode('utf-8')).decode('ascii'),
+        "timestamp": entry.timestamp
+    }
+
 # Ký PDF với certificate
 @app.post("/sign-pdf")
 async def sign_pdf_standard(pdf_file: UploadFile = File(...), certificate: UploadFile = File(...), password: str = Form("")):
@@ -9,12 +9,13 @@ SHA256_DIGEST_INFO = bytes([
 ])
 
 class DigitalSignature:
-    def __init__(self, key_size=512):
+    def __init__(self, key_size=512, ledger=None):
         self.rsa = RSA(key_size=key_size)
         self.sha256 = SHA256()
         self.public_key = None
         self.private_key = None
         self.key_size = key_size
+        self.ledger = ledger
 
     # Thêm padding PKCS#1 v1.5 vào hash
     def pkcs1_pad(self, hash_bytes: bytes, key_size_bytes: int) -> int:
@@ -59,9 +60,18 @@ class DigitalSignature:
         hash_hex = self.sha256.hash(message)
         hash_bytes = bytes.fromhex(hash_hex)
         print(f"SHA-256 Hash: {hash_hex}")
+        # Digest đã được ký bằng key này thì lấy lại từ ledger, bỏ qua bước lũy thừa
+        if self.ledger is not None:
+            signature = self.ledger.find_signature(private_key, hash_bytes)
+            if signature is not None:
+                print("Chữ ký lấy từ ledger")
+                return signature
         padded_message = self.pkcs1_pad(hash_bytes, key_size_bytes)
         print(f"PKCS#1 v1.5 Padded (int): {padded_message}")
-        return self.rsa.decrypt(padded_message, private_key)
+        signature = self.rsa.decrypt(padded_message, private_key)
+        if self.ledger is not None:
+            self.ledger.record(private_key, hash_bytes, signature)
+        return signature
 
     # Kiểm tra chữ ký có đúng không
     def verify(self, message, signature, public_key=None):
@@ -0,0 +1,360 @@
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+
+from crypto.sha256 import SHA256
+
+try:
+    import fcntl
+except ImportError:  # Windows: không có flock
+    fcntl = None
+
+# Log: MAGIC || log_id(16) || record || record || ...
+# Record: fingerprint(32) || digest(32) || key_check(32) || timestamp(f64) || sig_len(u16) || signature || crc32
+# crc32 tính trên phần trước nó, dùng để phát hiện record ghi dở hoặc vùng toàn byte 0 sau crash
+LOG_MAGIC = b'DSLOG001'
+LOG_HEADER_SIZE = len(LOG_MAGIC) + 16
+RECORD_HEADER = struct.Struct('>32s32s32sdH')
+RECORD_CRC = struct.Struct('>I')
+
+# Index: header || slot[capacity] (open addressing, linear probing)
+# Header: magic || log_id || capacity || count || log_size (số byte của log đã được đánh index) || last_offset
+# log_id gắn index với đúng file log, index của log khác sẽ bị dựng lại
+# last_offset là offset của record cuối đã index (0 nếu chưa có), dùng để kiểm tra log_size đúng ranh giới record
+# Slot: fingerprint(32) || digest(32) || offset(u64), offset = 0 nghĩa là slot trống
+INDEX_MAGIC = b'DSIDX001'
+INDEX_HEADER = struct.Struct('>8s16sQQQQ')
+INDEX_SLOT = struct.Struct('>32s32sQ')
+INITIAL_CAPACITY = 1 << 12
+
+
+class LedgerEntry(NamedTuple):
+    fingerprint: bytes
+    digest: bytes
+    signature: int
+    timestamp: float
+
+
+class SignatureLedger:
+    """
+    Sổ cái chữ ký append-only: log nhị phân + hash index được memory-map.
+    Tra cứu (fingerprint khóa, digest SHA-256) là O(1) và không nạp log vào RAM.
+    Nhiều process dùng chung thư mục được đồng bộ bằng flock trên signatures.lock;
+    trên hệ thống không có fcntl chỉ hỗ trợ một process.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, 'signatures.log')
+        self.index_path = os.path.join(directory, 'signatures.idx')
+        self.sha256 = SHA256()
+        self._lock = threading.Lock()
+        self._lock_file = open(os.path.join(directory, 'signatures.lock'), 'a+b')
+        self._index = None
+        self._index_file = None
+        with self._locked():
+            self._open_log()
+            self._open_index()
+            self._replay_log(truncate=True)
+
+    # Fingerprint của khóa = SHA-256(n), dùng chung cho public key (e, n) và private key (d, n)
+    def key_fingerprint(self, key: tuple) -> bytes:
+        n = key[1]
+        if n <= 0:
+            raise ValueError("Modulus n phải là số nguyên dương")
+        return bytes.fromhex(self.sha256.hash(n.to_bytes((n.bit_length() + 7) // 8, 'big')))
+
+    # Giá trị kiểm tra private key, tránh trả chữ ký cho người chỉ biết n
+    def _key_check(self, private_key: tuple) -> bytes:
+        return bytes.fromhex(self.sha256.hash(f"{private_key[0]}:{private_key[1]}"))
+
+    # Tra cứu chữ ký của digest theo khóa (public hoặc private)
+    def lookup(self, key: tuple, digest: bytes) -> Optional[LedgerEntry]:
+        fingerprint = self.key_fingerprint(key)
+        with self._locked():
+            self._catch_up(truncate=False)
+            found = self._locate(fingerprint, digest, truncate=False)
+        return None if found is None else found[0]
+
+    # Lấy lại chữ ký đã ký trước đó, chỉ khi đúng private key đã dùng để ký
+    def find_signature(self, private_key: tuple, digest: bytes) -> Optional[int]:
+        fingerprint = self.key_fingerprint(private_key)
+        with self._locked():
+            self._catch_up(truncate=False)
+            found = self._locate(fingerprint, digest, truncate=False)
+        if found is None:
+            return None
+        entry, key_check = found
+        if key_check != self._key_check(private_key):
+            return None
+        return entry.signature
+
+    # Ghi chữ ký mới vào log và index (bỏ qua nếu đã có)
+    def record(self, private_key: tuple, digest: bytes, signature: int) -> LedgerEntry:
+        if len(digest) != 32:
+            raise ValueError("Digest SHA-256 phải dài 32 bytes")
+        fingerprint = self.key_fingerprint(private_key)
+        key_check = self._key_check(private_key)
+        sig_len = (private_key[1].bit_length() + 7) // 8
+        entry = LedgerEntry(fingerprint, digest, signature, time.time())
+        with self._locked():
+            self._catch_up(truncate=True)
+            found = self._locate(fingerprint, digest, truncate=True)
+            if found is not None:
+                return found[0]
+            self._log.seek(0, os.SEEK_END)
+            offset = self._log.tell()
+            data = RECORD_HEADER.pack(fingerprint, digest, key_check, entry.timestamp, sig_len)
+            data += signature.to_bytes(sig_len, 'big')
+            self._log.write(data + RECORD_CRC.pack(zlib.crc32(data)))
+            # Record phải nằm trên đĩa trước khi index trỏ tới nó
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            count = INDEX_HEADER.unpack_from(self._index, 0)[3]
+            self._insert(fingerprint, digest, offset, count)
+            self._publish(count + 1, self._log.tell(), offset)
+        return entry
+
+    def __len__(self):
+        with self._locked():
+            return INDEX_HEADER.unpack_from(self._index, 0)[3]
+
+    def close(self):
+        with self._locked():
+            self._index.flush()
+            self._index.close()
+            self._index_file.close()
+            self._log.close()
+        self._lock_file.close()
+
+    # Khóa giữa các thread (threading.Lock) và giữa các process (flock)
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                self._sync_index()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    # Process khác đã thay file index (grow/rebuild) thì map lại file mới
+    def _sync_index(self):
+        if self._index_file is None:
+            return
+        if os.stat(self.index_path).st_ino != os.fstat(self._index_file.fileno()).st_ino:
+            self._index.close()
+            self._index_file.close()
+            self._map_index()
+
+    def _open_log(self):
+        mode = 'r+b' if os.path.exists(self.log_path) else 'w+b'
+        self._log = open(self.log_path, mode)
+        head = self._log.read(LOG_HEADER_SIZE)
+        if len(head) == LOG_HEADER_SIZE and head.startswith(LOG_MAGIC):
+            self._log_id = head[len(LOG_MAGIC):]
+            return
+        # Log rỗng hoặc header ghi dở (crash khi tạo file) thì ghi lại header
+        if len(head) < LOG_HEADER_SIZE and (LOG_MAGIC.startswith(head) or head.startswith(LOG_MAGIC)):
+            self._log_id = os.urandom(LOG_HEADER_SIZE - len(LOG_MAGIC))
+            self._log.seek(0)
+            self._log.truncate()
+            self._log.write(LOG_MAGIC + self._log_id)
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            return
+        self._log.close()
+        raise ValueError(f"File log không hợp lệ: {self.log_path}")
+
+    def _open_index(self):
+        valid = False
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'rb') as f:
+                header = f.read(INDEX_HEADER.size)
+            if len(header) == INDEX_HEADER.size:
+                magic, log_id, capacity, _, _, _ = INDEX_HEADER.unpack(header)
+                size = INDEX_HEADER.size + capacity * INDEX_SLOT.size
+                valid = (magic == INDEX_MAGIC and log_id == self._log_id and capacity > 0
+                         and os.path.getsize(self.index_path) == size)
+        # Index hỏng, chưa có hoặc thuộc log khác thì dựng lại từ log
+        if not valid:
+            self._replace_index(INITIAL_CAPACITY, LOG_HEADER_SIZE)
+        self._map_index()
+
+    def _create_index(self, path: str, capacity: int, log_size: int):
+        with open(path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, self._log_id, capacity, 0, log_size, 0))
+            f.truncate(INDEX_HEADER.size + capacity * INDEX_SLOT.size)
+
+    # Tạo index rỗng qua file tạm + os.replace để process khác không map phải file bị cắt
+    def _replace_index(self, capacity: int, log_size: int):
+        tmp_path = self.index_path + '.tmp'
+        self._create_index(tmp_path, capacity, log_size)
+        os.replace(tmp_path, self.index_path)
+
+    def _map_index(self):
+        self._index_file = open(self.index_path, 'r+b')
+        self._index = mmap.mmap(self._index_file.fileno(), 0)
+
+    # Log dài hơn phần đã index (process khác chết giữa fsync và _insert) thì đánh index phần còn lại
+    def _catch_up(self, truncate: bool):
+        if INDEX_HEADER.unpack_from(self._index, 0)[4] != self._log.seek(0, os.SEEK_END):
+            self._replay_log(truncate)
+
+    # Đánh index phần log chưa có trong index (sau crash hoặc khi dựng lại index).
+    # truncate=False dùng cho đường đọc: không bao giờ cắt log.
+    def _replay_log(self, truncate: bool):
+        count, log_size, last_offset = INDEX_HEADER.unpack_from(self._index, 0)[3:6]
+        end = self._log.seek(0, os.SEEK_END)
+        # log_size không nằm đúng ranh giới record (index hỏng hoặc log bị thay) thì dựng lại index
+        if not self._is_record_boundary(log_size, last_offset, end):
+            self._rebuild_index(truncate)
+            return
+        offset = log_size
+        while offset < end:
+            record = self._read_record(offset)
+            if record is None:
+                next_offset = self._next_record(offset, end)
+                if next_offset is None:
+                    break
+                # Vùng hỏng giữa log: giữ nguyên byte, bỏ qua tới record hợp lệ tiếp theo
+                print(f"Ledger: bỏ qua {next_offset - offset} byte hỏng tại offset {offset} trong {self.log_path}")
+                offset = next_offset
+                continue
+            fingerprint, digest = record[0].fingerprint, record[0].digest
+            next_offset = self._log.tell()
+            last_offset = offset
+            found = self._find_offset(fingerprint, digest)
+            if found is None:
+                self._insert(fingerprint, digest, offset, count)
+                count += 1
+            elif found == offset:
+                # Slot đã xuống đĩa nhưng header (count, log_size) chưa kịp publish
+                count += 1
+            elif not self._record_matches(found, fingerprint, digest):
+                self._rebuild_index(truncate)
+                return
+            offset = next_offset
+        # Chỉ cắt khi không còn record hợp lệ nào phía sau, tức record ghi dở ở cuối log
+        if offset < end and truncate:
+            self._log.truncate(offset)
+            os.fsync(self._log.fileno())
+        self._publish(count, offset, last_offset)
+
+    # log_size hợp lệ khi bằng đầu log (chưa có record) hoặc ngay sau record tại last_offset
+    def _is_record_boundary(self, log_size: int, last_offset: int, end: int) -> bool:
+        if log_size == LOG_HEADER_SIZE:
+            return last_offset == 0
+        if log_size > end or last_offset < LOG_HEADER_SIZE or last_offset >= log_size:
+            return False
+        return self._read_record(last_offset) is not None and self._log.tell() == log_size
+
+    # Tìm record hợp lệ đầu tiên sau vùng hỏng bắt đầu tại start
+    def _next_record(self, start: int, end: int) -> Optional[int]:
+        for offset in range(start + 1, end - RECORD_HEADER.size - RECORD_CRC.size + 1):
+            if self._read_record(offset) is not None:
+                return offset
+        return None
+
+    # Dựng lại index từ đầu log
+    def _rebuild_index(self, truncate: bool):
+        self._index.close()
+        self._index_file.close()
+        self._replace_index(INITIAL_CAPACITY, LOG_HEADER_SIZE)
+        self._map_index()
+        self._replay_log(truncate)
+
+    # Tìm record theo (fingerprint, digest); slot trỏ sai record (index cũ của log khác) thì dựng lại index
+    def _locate(self, fingerprint: bytes, digest: bytes, truncate: bool) -> Optional[tuple[LedgerEntry, bytes]]:
+        offset = self._find_offset(fingerprint, digest)
+        if offset is None:
+            return None
+        found = self._read_record(offset)
+        if found is None or found[0].fingerprint != fingerprint or found[0].digest != digest:
+            self._rebuild_index(truncate)
+            offset = self._find_offset(fingerprint, digest)
+            found = None if offset is None else self._read_record(offset)
+        return found
+
+    def _record_matches(self, offset: int, fingerprint: bytes, digest: bytes) -> bool:
+        found = self._read_record(offset)
+        return found is not None and found[0].fingerprint == fingerprint and found[0].digest == digest
+
+    # Đọc record tại offset; None nếu thiếu byte hoặc sai crc32
+    def _read_record(self, offset: int) -> Optional[tuple[LedgerEntry, bytes]]:
+        self._log.seek(offset)
+        header = self._log.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return None
+        fingerprint, digest, key_check, timestamp, sig_len = RECORD_HEADER.unpack(header)
+        sig_bytes = self._log.read(sig_len)
+        crc = self._log.read(RECORD_CRC.size)
+        if len(sig_bytes) < sig_len or len(crc) < RECORD_CRC.size:
+            return None
+        if RECORD_CRC.unpack(crc)[0] != zlib.crc32(header + sig_bytes):
+            return None
+        return LedgerEntry(fingerprint, digest, int.from_bytes(sig_bytes, 'big'), timestamp), key_check
+
+    def _slot_start(self, fingerprint: bytes, digest: bytes, capacity: int) -> int:
+        return (int.from_bytes(fingerprint[:8], 'big') ^ int.from_bytes(digest[:8], 'big')) % capacity
+
+    def _find_offset(self, fingerprint: bytes, digest: bytes) -> Optional[int]:
+        capacity = INDEX_HEADER.unpack_from(self._index, 0)[2]
+        slot = self._slot_start(fingerprint, digest, capacity)
+        for _ in range(capacity):
+            fp, dg, offset = INDEX_SLOT.unpack_from(self._index, INDEX_HEADER.size + slot * INDEX_SLOT.size)
+            if offset == 0:
+                return None
+            if fp == fingerprint and dg == digest:
+                return offset
+            slot = (slot + 1) % capacity
+        return None
+
+    # Ghi slot; count và log_size chỉ được cập nhật trong _publish
+    def _insert(self, fingerprint: bytes, digest: bytes, offset: int, count: int):
+        capacity = INDEX_HEADER.unpack_from(self._index, 0)[2]
+        # Giữ load factor <= 0.5 để probe ngắn
+        if (count + 1) * 2 > capacity:
+            self._grow(capacity * 2)
+            capacity *= 2
+        self._put_slot(self._index, capacity, fingerprint, digest, offset)
+
+    def _put_slot(self, index: mmap.mmap, capacity: int, fingerprint: bytes, digest: bytes, offset: int):
+        slot = self._slot_start(fingerprint, digest, capacity)
+        while INDEX_SLOT.unpack_from(index, INDEX_HEADER.size + slot * INDEX_SLOT.size)[2] != 0:
+            slot = (slot + 1) % capacity
+        INDEX_SLOT.pack_into(index, INDEX_HEADER.size + slot * INDEX_SLOT.size, fingerprint, digest, offset)
+
+    # Flush slot xuống đĩa trước, rồi mới ghi count/log_size vào header,
+    # để header trên đĩa không bao giờ tính những slot chưa được ghi
+    def _publish(self, count: int, log_size: int, last_offset: int):
+        capacity = INDEX_HEADER.unpack_from(self._index, 0)[2]
+        self._index.flush()
+        INDEX_HEADER.pack_into(self._index, 0, INDEX_MAGIC, self._log_id, capacity, count, log_size, last_offset)
+        self._index.flush(0, INDEX_HEADER.size)
+
+    # Nhân đôi bảng băm: rehash từ index cũ sang file mới rồi thay thế
+    def _grow(self, new_capacity: int):
+        _, _, capacity, count, log_size, last_offset = INDEX_HEADER.unpack_from(self._index, 0)
+        tmp_path = self.index_path + '.tmp'
+        self._create_index(tmp_path, new_capacity, log_size)
+        with open(tmp_path, 'r+b') as f:
+            new_index = mmap.mmap(f.fileno(), 0)
+            for slot in range(capacity):
+                fp, dg, offset = INDEX_SLOT.unpack_from(self._index, INDEX_HEADER.size + slot * INDEX_SLOT.size)
+                if offset != 0:
+                    self._put_slot(new_index, new_capacity, fp, dg, offset)
+            INDEX_HEADER.pack_into(new_index, 0, INDEX_MAGIC, self._log_id, new_capacity, count, log_size, last_offset)
+            new_index.flush()
+            new_index.close()
+        self._index.close()
+        self._index_file.close()
+        os.replace(tmp_path, self.index_path)
+        self._map_index()
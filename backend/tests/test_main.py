@@ -0,0 +1,84 @@
+import base64
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("fastapi")
+pytest.importorskip("pyhanko")
+from fastapi.testclient import TestClient
+
+import main
+from crypto.sha256 import SHA256
+from signature.digital_signature import DigitalSignature
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "LEDGER_DIR", str(tmp_path))
+    with TestClient(main.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="module")
+def keys():
+    public_key, private_key = DigitalSignature(key_size=512).generate_keys()
+    return main.key_to_str(public_key), main.key_to_str(private_key)
+
+
+@pytest.mark.parametrize("value", ["0:3233", "-1:3233", "65537:0", "65537:-5"])
+def test_str_to_key_rejects_non_positive(value):
+    with pytest.raises(ValueError):
+        main.str_to_key(value)
+
+
+def test_sign_then_ledger_lookup(client, keys):
+    public_key, private_key = keys
+    response = client.post("/sign", files={
+        "file": ("doc.txt", b"hello"), "private_key": ("key.txt", private_key.encode())
+    })
+    assert response.status_code == 200
+    signature_b64 = response.content.decode()
+
+    digest = SHA256().hash(b"hello")
+    response = client.post("/ledger/lookup", data={"digest": digest},
+                           files={"public_key_file": ("pub.txt", public_key.encode())})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["found"] is True
+    assert body["signature"] == signature_b64
+
+    response = client.post("/ledger/lookup", data={"digest": SHA256().hash(b"other")},
+                           files={"public_key_file": ("pub.txt", public_key.encode())})
+    assert response.json()["found"] is False
+
+
+@pytest.mark.parametrize("digest", ["xyz", "ab" * 31])
+def test_ledger_lookup_rejects_bad_digest(client, keys, digest):
+    response = client.post("/ledger/lookup", data={"digest": digest},
+                           files={"public_key_file": ("pub.txt", keys[0].encode())})
+    assert response.status_code == 400
+
+
+def test_ledger_lookup_rejects_non_positive_key(client):
+    response = client.post("/ledger/lookup", data={"digest": "ab" * 32},
+                           files={"public_key_file": ("pub.txt", b"65537:-5")})
+    assert response.status_code == 400
+
+
+def test_sign_rejects_non_positive_key(client):
+    response = client.post("/sign", files={
+        "file": ("doc.txt", b"hello"), "private_key": ("key.txt", b"-3:3233")
+    })
+    assert response.status_code == 400
+
+
+def test_verify_rejects_non_positive_key(client):
+    signature = base64.b64encode(b"12345")
+    response = client.post("/verify", files={
+        "file": ("doc.txt", b"hello"), "signature": ("doc.sig", signature),
+        "public_key_file": ("pub.txt", b"65537:0")
+    })
+    assert response.status_code == 400
@@ -0,0 +1,248 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crypto.sha256 import SHA256
+from signature.digital_signature import DigitalSignature
+from signature.signature_ledger import (
+    INDEX_HEADER, INITIAL_CAPACITY, LOG_HEADER_SIZE, LOG_MAGIC, RECORD_CRC, RECORD_HEADER, SignatureLedger
+)
+
+# Key giả chỉ dùng làm định danh trong ledger (không cần là RSA hợp lệ)
+PRIVATE_KEY = (7, 3233 * 1000003)
+SIG_LEN = (PRIVATE_KEY[1].bit_length() + 7) // 8
+
+
+def digest(message: bytes) -> bytes:
+    return bytes.fromhex(SHA256().hash(message))
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = SignatureLedger(str(tmp_path))
+    yield ledger
+    ledger.close()
+
+
+def test_sign_twice_uses_ledger(tmp_path, ledger):
+    ds = DigitalSignature(key_size=512, ledger=ledger)
+    ds.generate_keys()
+    first = ds.sign(b"hello")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("rsa.decrypt không được gọi khi đã có trong ledger")
+
+    ds.rsa.decrypt = fail
+    second = ds.sign(b"hello")
+    assert second == first
+    assert ds.verify(b"hello", second)
+    assert ledger.lookup(ds.get_public_key(), digest(b"hello")).signature == first
+
+
+def test_find_signature_requires_matching_private_key(ledger):
+    ledger.record(PRIVATE_KEY, digest(b"m"), 42)
+    assert ledger.find_signature(PRIVATE_KEY, digest(b"m")) == 42
+    assert ledger.find_signature((PRIVATE_KEY[0] + 2, PRIVATE_KEY[1]), digest(b"m")) is None
+
+
+def test_grow_and_reopen(tmp_path):
+    count = INITIAL_CAPACITY // 2 + 10
+    ledger = SignatureLedger(str(tmp_path))
+    for i in range(count):
+        ledger.record(PRIVATE_KEY, digest(b"%d" % i), i)
+    assert len(ledger) == count
+    for i in range(count):
+        assert ledger.find_signature(PRIVATE_KEY, digest(b"%d" % i)) == i
+    ledger.close()
+
+    reopened = SignatureLedger(str(tmp_path))
+    assert len(reopened) == count
+    for i in range(count):
+        assert reopened.lookup(PRIVATE_KEY, digest(b"%d" % i)).signature == i
+    reopened.close()
+
+
+def test_torn_record_is_truncated(tmp_path):
+    ledger = SignatureLedger(str(tmp_path))
+    for i in range(3):
+        ledger.record(PRIVATE_KEY, digest(b"%d" % i), i)
+    ledger.close()
+    log_path = os.path.join(str(tmp_path), 'signatures.log')
+    full_size = os.path.getsize(log_path)
+    assert full_size == LOG_HEADER_SIZE + 3 * (RECORD_HEADER.size + SIG_LEN + RECORD_CRC.size)
+    with open(log_path, 'ab') as f:
+        f.write(b'\x00' * (RECORD_HEADER.size + 3))
+
+    reopened = SignatureLedger(str(tmp_path))
+    assert os.path.getsize(log_path) == full_size
+    assert len(reopened) == 3
+    reopened.record(PRIVATE_KEY, digest(b"3"), 3)
+    assert reopened.find_signature(PRIVATE_KEY, digest(b"3")) == 3
+    reopened.close()
+
+
+def test_missing_index_is_rebuilt(tmp_path):
+    ledger = SignatureLedger(str(tmp_path))
+    for i in range(5):
+        ledger.record(PRIVATE_KEY, digest(b"%d" % i), i)
+    ledger.close()
+    os.remove(os.path.join(str(tmp_path), 'signatures.idx'))
+
+    reopened = SignatureLedger(str(tmp_path))
+    assert len(reopened) == 5
+    for i in range(5):
+        assert reopened.find_signature(PRIVATE_KEY, digest(b"%d" % i)) == i
+    reopened.close()
+
+
+def build_stale_index(tmp_path, same_log_id):
+    dir_a, dir_b = str(tmp_path / 'a'), str(tmp_path / 'b')
+    ledger_a = SignatureLedger(dir_a)
+    for i in range(5):
+        ledger_a.record(PRIVATE_KEY, digest(b"a%d" % i), 100 + i)
+    ledger_a.close()
+    ledger_b = SignatureLedger(dir_b)
+    for i in range(10):
+        ledger_b.record(PRIVATE_KEY, digest(b"b%d" % i), 200 + i)
+    ledger_b.close()
+    index_path = os.path.join(dir_b, 'signatures.idx')
+    shutil.copy(os.path.join(dir_a, 'signatures.idx'), index_path)
+    if same_log_id:
+        # Giả lập index cũ mang đúng log_id (vd. log được khôi phục từ bản sao)
+        with open(os.path.join(dir_b, 'signatures.log'), 'rb') as f:
+            log_id = f.read(LOG_HEADER_SIZE)[len(LOG_MAGIC):]
+        with open(index_path, 'r+b') as f:
+            f.seek(len(LOG_MAGIC))
+            f.write(log_id)
+    return dir_b
+
+
+@pytest.mark.parametrize('same_log_id', [False, True])
+def test_stale_index_from_other_log(tmp_path, same_log_id):
+    stale = SignatureLedger(build_stale_index(tmp_path, same_log_id))
+    assert stale.find_signature(PRIVATE_KEY, digest(b"a0")) is None
+    for i in range(10):
+        assert stale.find_signature(PRIVATE_KEY, digest(b"b%d" % i)) == 200 + i
+    assert len(stale) == 10
+    stale.close()
+
+
+def test_partial_magic_is_rewritten(tmp_path):
+    with open(os.path.join(str(tmp_path), 'signatures.log'), 'wb') as f:
+        f.write(LOG_MAGIC[:3])
+    ledger = SignatureLedger(str(tmp_path))
+    assert len(ledger) == 0
+    ledger.close()
+    with open(os.path.join(str(tmp_path), 'signatures.log'), 'rb') as f:
+        header = f.read()
+    assert len(header) == LOG_HEADER_SIZE and header.startswith(LOG_MAGIC)
+
+
+def test_non_positive_modulus_rejected(ledger):
+    with pytest.raises(ValueError):
+        ledger.lookup((65537, -5), digest(b"m"))
+
+
+def record_size() -> int:
+    return RECORD_HEADER.size + SIG_LEN + RECORD_CRC.size
+
+
+def test_corrupted_record_in_middle_keeps_later_records(tmp_path):
+    ledger = SignatureLedger(str(tmp_path))
+    for i in range(5):
+        ledger.record(PRIVATE_KEY, digest(b"%d" % i), i)
+    ledger.close()
+    log_path = os.path.join(str(tmp_path), 'signatures.log')
+    full_size = os.path.getsize(log_path)
+    with open(log_path, 'r+b') as f:
+        f.seek(LOG_HEADER_SIZE + record_size() + 40)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xff]))
+    os.remove(os.path.join(str(tmp_path), 'signatures.idx'))
+
+    reopened = SignatureLedger(str(tmp_path))
+    assert os.path.getsize(log_path) == full_size
+    assert len(reopened) == 4
+    assert reopened.find_signature(PRIVATE_KEY, digest(b"1")) is None
+    for i in (0, 2, 3, 4):
+        assert reopened.find_signature(PRIVATE_KEY, digest(b"%d" % i)) == i
+    reopened.close()
+
+
+def test_junk_between_records_from_crashed_writer_is_kept(tmp_path):
+    writer = SignatureLedger(str(tmp_path))
+    writer.record(PRIVATE_KEY, digest(b"a"), 1)
+    log_path = os.path.join(str(tmp_path), 'signatures.log')
+    # Worker khác ghi dở rồi chết; writer không thấy và tiếp tục ghi sau vùng rác
+    with open(log_path, 'ab') as f:
+        f.write(b'\x13' * 50)
+    writer._catch_up = lambda truncate: None
+    writer.record(PRIVATE_KEY, digest(b"b"), 2)
+    writer.record(PRIVATE_KEY, digest(b"c"), 3)
+    writer.close()
+    full_size = os.path.getsize(log_path)
+    os.remove(os.path.join(str(tmp_path), 'signatures.idx'))
+
+    reopened = SignatureLedger(str(tmp_path))
+    assert os.path.getsize(log_path) == full_size
+    assert len(reopened) == 3
+    for message, signature in ((b"a", 1), (b"b", 2), (b"c", 3)):
+        assert reopened.find_signature(PRIVATE_KEY, digest(message)) == signature
+    reopened.close()
+
+
+@pytest.mark.parametrize('log_size', [0, LOG_HEADER_SIZE - 1, LOG_HEADER_SIZE + 7])
+def test_invalid_index_log_size_rebuilds_without_truncating(tmp_path, log_size):
+    ledger = SignatureLedger(str(tmp_path))
+    for i in range(3):
+        ledger.record(PRIVATE_KEY, digest(b"%d" % i), i)
+    ledger.close()
+    log_path = os.path.join(str(tmp_path), 'signatures.log')
+    full_size = os.path.getsize(log_path)
+    with open(os.path.join(str(tmp_path), 'signatures.idx'), 'r+b') as f:
+        header = list(INDEX_HEADER.unpack(f.read(INDEX_HEADER.size)))
+        header[4] = log_size
+        f.seek(0)
+        f.write(INDEX_HEADER.pack(*header))
+
+    reopened = SignatureLedger(str(tmp_path))
+    assert os.path.getsize(log_path) == full_size
+    assert len(reopened) == 3
+    for i in range(3):
+        assert reopened.find_signature(PRIVATE_KEY, digest(b"%d" % i)) == i
+    reopened.close()
+
+
+def test_orphaned_record_from_other_instance_is_indexed(tmp_path):
+    crashed = SignatureLedger(str(tmp_path))
+    other = SignatureLedger(str(tmp_path))
+    # Giả lập process chết sau khi fsync record nhưng trước khi ghi index
+    crashed._insert = lambda *args: None
+    crashed._publish = lambda *args: None
+    crashed.record(PRIVATE_KEY, digest(b"orphan"), 7)
+
+    assert other.find_signature(PRIVATE_KEY, digest(b"orphan")) == 7
+    other.record(PRIVATE_KEY, digest(b"next"), 8)
+    other.close()
+
+    reopened = SignatureLedger(str(tmp_path))
+    assert len(reopened) == 2
+    assert reopened.find_signature(PRIVATE_KEY, digest(b"orphan")) == 7
+    assert reopened.find_signature(PRIVATE_KEY, digest(b"next")) == 8
+    reopened.close()
+
+
+def test_lookup_never_truncates_log(tmp_path, ledger):
+    ledger.record(PRIVATE_KEY, digest(b"a"), 1)
+    log_path = os.path.join(str(tmp_path), 'signatures.log')
+    with open(log_path, 'ab') as f:
+        f.write(b'\x00' * 10)
+    size = os.path.getsize(log_path)
+    assert ledger.lookup(PRIVATE_KEY, digest(b"a")).signature == 1
+    assert ledger.find_signature(PRIVATE_KEY, digest(b"b")) is None
+    assert os.path.getsize(log_path) == size